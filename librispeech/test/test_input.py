@@ -9,6 +9,7 @@ from __future__ import print_function
 
 import sys
 import unittest
+from concurrent.futures import ProcessPoolExecutor
 
 sys.path.append('../../')
 from librispeech.path import Path
@@ -46,56 +47,61 @@ CONFIG = {
     'deltadelta': True
 }
 
+TOOLS = ['htk', 'python_speech_features', 'librosa']
 
-class TestInput(unittest.TestCase):
 
-    def test(self):
+def check_tool(tool):
+    # The three normalize modes of one tool read the same audio files,
+    # so they run sequentially inside a single worker
+    for normalize in ['global', 'speaker', 'utterance']:
+        check(normalize=normalize, tool=tool)
 
-        self.check(normalize='global', tool='htk')
-        self.check(normalize='speaker', tool='htk')
-        self.check(normalize='utterance', tool='htk')
 
-        self.check(normalize='global', tool='python_speech_features')
-        self.check(normalize='speaker', tool='python_speech_features')
-        self.check(normalize='utterance', tool='python_speech_features')
+@measure_time
+def check(normalize, tool):
 
-        self.check(normalize='global', tool='librosa')
-        self.check(normalize='speaker', tool='librosa')
-        self.check(normalize='utterance', tool='librosa')
+    print('==================================================')
+    print('  normalize: %s' % normalize)
+    print('  tool: %s' % tool)
+    print('==================================================')
 
-    @measure_time
-    def check(self, normalize, tool):
+    audio_paths = htk_paths if tool == 'htk' else wav_paths
 
-        print('==================================================')
-        print('  normalize: %s' % normalize)
-        print('  tool: %s' % tool)
-        print('==================================================')
+    print('---------- train100h ----------')
+    global_mean_male, global_mean_female, global_std_male, global_std_female = read_audio(
+        audio_paths=audio_paths['train100h'],
+        tool=tool,
+        config=CONFIG,
+        normalize=normalize,
+        is_training=True,
+        speaker_gender_dict=path.speaker_gender_dict)
 
-        audio_paths = htk_paths if tool == 'htk' else wav_paths
+    for data_type in ['dev_clean', 'dev_other', 'test_clean', 'test_other']:
 
-        print('---------- train100h ----------')
-        global_mean_male, global_mean_female, global_std_male, global_std_female = read_audio(
-            audio_paths=audio_paths['train100h'],
+        print('---------- %s ----------' % data_type)
+        read_audio(
+            audio_paths=audio_paths[data_type],
             tool=tool,
             config=CONFIG,
             normalize=normalize,
-            is_training=True,
-            speaker_gender_dict=path.speaker_gender_dict)
-
-        for data_type in ['dev_clean', 'dev_other', 'test_clean', 'test_other']:
-
-            print('---------- %s ----------' % data_type)
-            read_audio(
-                audio_paths=audio_paths[data_type],
-                tool=tool,
-                config=CONFIG,
-                normalize=normalize,
-                is_training=False,
-                speaker_gender_dict=path.speaker_gender_dict,
-                global_mean_male=global_mean_male,
-                global_mean_female=global_mean_female,
-                global_std_male=global_std_male,
-                global_std_female=global_std_female)
+            is_training=False,
+            speaker_gender_dict=path.speaker_gender_dict,
+            global_mean_male=global_mean_male,
+            global_mean_female=global_mean_female,
+            global_std_male=global_std_male,
+            global_std_female=global_std_female)
+
+
+class TestInput(unittest.TestCase):
+
+    def test(self):
+
+        # Each tool is independent of the others, so run one worker
+        # process per tool
+        with ProcessPoolExecutor(max_workers=len(TOOLS)) as executor:
+            futures = [executor.submit(check_tool, tool) for tool in TOOLS]
+            for future in futures:
+                future.result()
 
 
 if __name__ == '__main__':
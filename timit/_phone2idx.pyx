@@ -0,0 +1,31 @@
+# cython: language_level=3
+# -*- coding: utf-8 -*-
+
+"""Cython tokenizer for the Phone2idx hot path (TIMIT corpus).
+
+Build in place with:
+    python setup_phone2idx.py build_ext --inplace
+The pure-Python np.fromiter path in transcript_phone.py is used when
+this extension is not built.
+"""
+
+import numpy as np
+
+cimport numpy as cnp
+
+
+cpdef cnp.ndarray[cnp.uint8_t, ndim=1] tokenize(list phone_list,
+                                                dict map_dict):
+    """Convert a list of phones to the corresponding indices.
+    Args:
+        phone_list (list): list of phones (string)
+        map_dict (dict): key => phone, value => index (< 256)
+    Returns:
+        index_list (np.ndarray): phone indices
+    """
+    cdef Py_ssize_t i, n = len(phone_list)
+    cdef cnp.ndarray[cnp.uint8_t, ndim=1] index_list = np.empty(
+        n, dtype=np.uint8)
+    for i in range(n):
+        index_list[i] = <cnp.uint8_t>map_dict[phone_list[i]]
+    return index_list
@@ -1,14 +1,5 @@
-import os
-
-rf = open('wav2htk_concat_all.scp', "r")
-wf = open('wav2htk_simple.scp', "w")
-
-for line in rf:
-    parts = line.split('  ')
-    simple_line = parts[0] + '  ' + parts[0][:-3] + 'htk\n'
-    wf.write(simple_line)
-
-rf.close()
-wf.close()
-
+with open('wav2htk_concat_all.scp', 'r') as rf:
+    wav_paths = [line.partition('  ')[0] for line in rf.readlines()]
 
+with open('wav2htk_simple.scp', 'w') as wf:
+    wf.writelines(p + '  ' + p[:-3] + 'htk\n' for p in wav_paths)
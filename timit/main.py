@@ -10,9 +10,11 @@ from __future__ import print_function
 from os.path import join, isfile
 import sys
 import argparse
+import csv
+import multiprocessing as mp
+from struct import unpack
 from tqdm import tqdm
 import numpy as np
-import pandas as pd
 import pickle
 
 sys.path.append('../')
@@ -20,8 +22,8 @@ from timit.path import Path
 from timit.transcript_character import read_char
 from timit.transcript_phone import read_phone
 from timit.input_data import read_audio
+from utils.inputs.wav2feature_python_speech_features import wav2feature as w2f_psf
 from utils.util import mkdir_join
-from utils.dataset import add_element
 
 parser = argparse.ArgumentParser()
 parser.add_argument('--data_path', type=str, help='path to TIMIT dataset')
@@ -67,6 +69,72 @@ CONFIG = {
 if args.save_format == 'htk':
     assert args.tool == 'htk'
 
+# Keyword arguments for wav2feature, resolved from CONFIG once instead
+# of per utterance
+W2F_KWARGS = {
+    'feature_type': CONFIG['feature_type'],
+    'feature_dim': CONFIG['channels'],
+    'use_energy': CONFIG['energy'],
+    'use_delta1': CONFIG['delta'],
+    'use_delta2': CONFIG['deltadelta'],
+    'window': CONFIG['window'],
+    'slide': CONFIG['slide']
+}
+
+
+def frame_num_from_path(input_utt_save_path, save_format):
+    """Read the number of frames from the file header.
+    Args:
+        input_utt_save_path (string): path to an input feature file
+        save_format (string): numpy or htk
+    Returns:
+        frame_num (int): the number of frames
+    """
+    # NOTE: read only the header instead of loading the whole array
+    with open(input_utt_save_path, 'rb') as f:
+        if save_format == 'numpy':
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape = np.lib.format.read_array_header_1_0(f)[0]
+            else:
+                shape = np.lib.format.read_array_header_2_0(f)[0]
+            return shape[0]
+        elif save_format == 'htk':
+            return unpack(">IIHH", f.read(12))[0]
+        else:
+            raise ValueError('save_format is numpy or htk.')
+
+
+def _extract_frame_num(utt_name_and_wav_path):
+    """Compute the number of frames of a wav file (run in a worker process).
+    Args:
+        utt_name_and_wav_path (tuple): (utt_name, wav_path)
+    Returns:
+        utt_name (string): utterance name
+        frame_num (int): the number of frames
+    """
+    utt_name, wav_path = utt_name_and_wav_path
+    return utt_name, w2f_psf(wav_path, **W2F_KWARGS).shape[0]
+
+
+def save_dataset_csv(csv_save_path, frame_nums, input_paths, transcripts,
+                     columns):
+    """Save dataset columns as a csv file.
+    Args:
+        csv_save_path (string): path to save the csv file
+        frame_nums (list): frame number per utterance
+        input_paths (list): input feature path per utterance
+        transcripts (list): transcript per utterance
+        columns (list): column names
+    """
+    # NOTE: same layout as DataFrame.to_csv (leading index column),
+    # without the DataFrame construction overhead
+    with open(csv_save_path, 'w', newline='') as f:
+        writer = csv.writer(f, lineterminator='\n')
+        writer.writerow([''] + columns)
+        writer.writerows(
+            zip(range(len(frame_nums)), frame_nums, input_paths, transcripts))
+
 
 def main():
 
@@ -139,93 +207,104 @@ def main():
             is_test=is_test)
 
         ########################################
-        # dataset (phone, csv)
+        # labels (character)
+        ########################################
+        # print('\n=> Processing transcripts (char)...')
+        # trans_dict_char = read_char(
+        #     label_paths=path.trans(data_type=data_type),
+        #     vocab_file_save_path=mkdir_join('./config', 'vocab_files'),
+        #     save_vocab_file=save_vocab_file,
+        #     is_test=is_test)
+
         ########################################
-        print('\n=> Saving dataset files (phone)...')
+        # dataset (csv)
+        ########################################
+        print('\n=> Saving dataset files...')
         dataset_save_path = mkdir_join(
             args.dataset_save_path, args.save_format, data_type)
         df_columns = ['frame_num', 'input_path', 'transcript']
-        df_phone61 = pd.DataFrame([], columns=df_columns)
-        df_phone48 = pd.DataFrame([], columns=df_columns)
-        df_phone39 = pd.DataFrame([], columns=df_columns)
+        # NOTE: the frame number and the input path are shared by all
+        # label types, so keep one column list per field instead of
+        # row tuples per label type
+        frame_nums, input_paths = [], []
+        phone61_trans, phone48_trans, phone39_trans = [], [], []
+        # char_trans, char_capital_trans = [], []
+
+        frame_num_dict = {}
+        if args.save_format in ['numpy', 'htk']:
+            frame_num_pickle_path = join(
+                input_save_path, data_type, 'frame_num.pickle')
+            if isfile(frame_num_pickle_path):
+                with open(frame_num_pickle_path, 'rb') as f:
+                    frame_num_dict = pickle.load(f)
+        else:
+            # Resolve each wav path once and reuse it in the dataset loop
+            utt2wav_path = {utt_name: path.utt2wav(utt_name)
+                            for utt_name in trans_dict.keys()}
+
+            # Extract features in parallel only to count frames
+            # (each utterance is independent and CPU-bound)
+            with mp.Pool(mp.cpu_count()) as p:
+                frame_num_dict = dict(
+                    tqdm(p.imap_unordered(_extract_frame_num,
+                                          utt2wav_path.items()),
+                         total=len(utt2wav_path)))
 
-        with open(join(input_save_path, data_type, 'frame_num.pickle'), 'rb') as f:
-            frame_num_dict = pickle.load(f)
+        # Resolve the branch on save_format once instead of per utterance
+        if args.save_format == 'numpy':
+            ext = '.npy'
+        elif args.save_format == 'htk':
+            ext = '.htk'
+        elif args.save_format == 'wav':
+            ext = None
+        else:
+            raise ValueError('save_format is numpy or htk or wav.')
 
+        # Resolve all input paths up front (maxsplit=1: the speaker is
+        # the prefix before the first underscore)
+        if ext is not None:
+            utt2input_path = {
+                utt_name: join(input_save_path, data_type,
+                               utt_name.split('_', 1)[0], utt_name + ext)
+                for utt_name in trans_dict.keys()}
+        else:
+            utt2input_path = utt2wav_path
+
+        # NOTE: a single pass over the utterances resolves the input path
+        # and the frame number once, shared by all label types
         for utt_name, trans_list in tqdm(trans_dict.items()):
-            if args.save_format == 'numpy':
-                speaker = utt_name.split('_')[0]
-                input_utt_save_path = join(
-                    input_save_path, data_type, speaker, utt_name + '.npy')
-            elif args.save_format == 'htk':
-                speaker = utt_name.split('_')[0]
-                input_utt_save_path = join(
-                    input_save_path, data_type, speaker, utt_name + '.htk')
-            elif args.save_format == 'wav':
-                input_utt_save_path = path.utt2wav(utt_name)
-            else:
-                raise ValueError('save_format is numpy or htk or wav.')
+            input_utt_save_path = utt2input_path[utt_name]
 
             assert isfile(input_utt_save_path)
-            frame_num = frame_num_dict[utt_name]
+            frame_num = frame_num_dict.get(utt_name)
+            if frame_num is None:
+                frame_num = frame_num_from_path(
+                    input_utt_save_path, args.save_format)
 
             phone61_indices, phone48_indices, phone39_indices = trans_list
 
-            df_phone61 = add_element(
-                df_phone61, [frame_num, input_utt_save_path, phone61_indices])
-            df_phone48 = add_element(
-                df_phone48, [frame_num, input_utt_save_path, phone48_indices])
-            df_phone39 = add_element(
-                df_phone39, [frame_num, input_utt_save_path, phone39_indices])
+            frame_nums.append(frame_num)
+            input_paths.append(input_utt_save_path)
+            phone61_trans.append(phone61_indices)
+            phone48_trans.append(phone48_indices)
+            phone39_trans.append(phone39_indices)
 
-        df_phone61.to_csv(join(dataset_save_path, 'phone61.csv'))
-        df_phone48.to_csv(join(dataset_save_path, 'phone48.csv'))
-        df_phone39.to_csv(join(dataset_save_path, 'phone39.csv'))
+            # char_indices, char_indices_capital = trans_dict_char[utt_name]
+            # char_trans.append(char_indices)
+            # char_capital_trans.append(char_indices_capital)
 
-        ########################################
-        # labels (character)
-        ########################################
-        # print('\n=> Processing transcripts (char)...')
-        # trans_dict = read_char(
-        #     label_paths=path.trans(data_type=data_type),
-        #     vocab_file_save_path=mkdir_join('./config', 'vocab_files'),
-        #     save_vocab_file=save_vocab_file,
-        #     is_test=is_test)
+        save_dataset_csv(join(dataset_save_path, 'phone61.csv'),
+                         frame_nums, input_paths, phone61_trans, df_columns)
+        save_dataset_csv(join(dataset_save_path, 'phone48.csv'),
+                         frame_nums, input_paths, phone48_trans, df_columns)
+        save_dataset_csv(join(dataset_save_path, 'phone39.csv'),
+                         frame_nums, input_paths, phone39_trans, df_columns)
 
-        ########################################
-        # dataset (character, csv)
-        ########################################
-        # print('\n=> Saving dataset files (char)...')
-        # df_char = pd.DataFrame([], columns=df_columns)
-        # df_char_capital = pd.DataFrame([], columns=df_columns)
-        #
-        # for utt_name, trans_list in tqdm(trans_dict.items()):
-        #     if args.save_format == 'numpy':
-        #         speaker = utt_name.split('_')[0]
-        #         input_utt_save_path = join(
-        #             input_save_path, data_type, speaker, utt_name + '.npy')
-        #     elif args.save_format == 'htk':
-        #         speaker = utt_name.split('_')[0]
-        #         input_utt_save_path = join(
-        #             input_save_path, data_type, speaker, utt_name + '.htk')
-        #     elif args.save_format == 'wav':
-        #         input_utt_save_path = path.utt2wav(utt_name)
-        #     else:
-        #         raise ValueError('save_format is numpy or htk or wav.')
-        #
-        #     assert isfile(input_utt_save_path)
-        #     frame_num = frame_num_dict[utt_name]
-        #
-        #     char_indices, char_indices_capital = trans_list
-        #
-        #     df_char = add_element(
-        #         df_char, [frame_num, input_utt_save_path, char_indices])
-        #     df_char_capital = add_element(
-        #         df_char_capital, [frame_num, input_utt_save_path, char_indices_capital])
-        #
-        # df_char.to_csv(join(dataset_save_path, 'character.csv'))
-        # df_char_capital.to_csv(
-        #     join(dataset_save_path, 'character_capital_divide.csv'))
+        # save_dataset_csv(join(dataset_save_path, 'character.csv'),
+        #                  frame_nums, input_paths, char_trans, df_columns)
+        # save_dataset_csv(join(dataset_save_path, 'character_capital_divide.csv'),
+        #                  frame_nums, input_paths, char_capital_trans,
+        #                  df_columns)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,14 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Build the optional Cython tokenizer:
+    python setup_phone2idx.py build_ext --inplace
+"""
+
+from distutils.core import setup
+
+import numpy as np
+from Cython.Build import cythonize
+
+setup(ext_modules=cythonize('_phone2idx.pyx'),
+      include_dirs=[np.get_include()])
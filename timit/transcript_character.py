@@ -7,7 +7,9 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
-from os.path import basename
+from os.path import basename, split, splitext
+from collections import deque
+from functools import lru_cache
 import re
 from tqdm import tqdm
 
@@ -48,6 +50,19 @@ class Char2idx(object):
         self.map_dict['<'] = vocab_count
         self.map_dict['>'] = vocab_count + 1
 
+        # Build a lookup table over byte values for the common case
+        # (all vocabulary entries are single ASCII characters)
+        self._lut = np.full(256, -1, dtype=np.int32)
+        for char, idx in self.map_dict.items():
+            if len(char) == 1:
+                self._lut[ord(char)] = idx
+
+        # Longest-match-first alternation over the vocabulary, so double
+        # letters are preferred over single characters in one regex pass
+        self._token_re = re.compile('|'.join(
+            re.escape(c)
+            for c in sorted(self.map_dict, key=len, reverse=True)))
+
     def __call__(self, str_char):
         """
         Args:
@@ -60,45 +75,23 @@ class Char2idx(object):
         # Convert from character to index
         if self.capital_divide:
             for word in str_char.split(self.space_mark):
-                # Replace the first character with the capital letter
-                index_list.append(self.map_dict[word[0].upper()])
-
-                # Check double-letters
-                skip_flag = False
-                for i in range(1, len(word) - 1, 1):
-                    if skip_flag:
-                        skip_flag = False
-                        continue
-
-                    if not skip_flag and word[i:i + 2] in self.map_dict.keys():
-                        index_list.append(self.map_dict[word[i:i + 2]])
-                        skip_flag = True
-                    else:
-                        index_list.append(self.map_dict[word[i]])
-
-                # Final character
-                if not skip_flag:
-                    index_list.append(self.map_dict[word[-1]])
+                # Replace the first character with the capital letter,
+                # then take the longest vocabulary match at each position
+                index_list.extend(
+                    self.map_dict[t]
+                    for t in self._token_re.findall(word[0].upper() + word[1:]))
 
         elif self.double_letter:
-            skip_flag = False
-            for i in range(len(str_char) - 1):
-                if skip_flag:
-                    skip_flag = False
-                    continue
-
-                if not skip_flag and str_char[i:i + 2] in self.map_dict.keys():
-                    index_list.append(self.map_dict[str_char[i:i + 2]])
-                    skip_flag = True
-                else:
-                    index_list.append(self.map_dict[str_char[i]])
-
-            # Final character
-            if not skip_flag:
-                index_list.append(self.map_dict[str_char[-1]])
+            index_list = [self.map_dict[t]
+                          for t in self._token_re.findall(str_char)]
 
         else:
-            index_list = list(map(lambda x: self.map_dict[x], list(str_char)))
+            # Index the lookup table with the byte values (one C-level
+            # gather instead of a per-character dict lookup)
+            index_arr = self._lut[np.frombuffer(
+                str_char.encode('ascii'), dtype=np.uint8)]
+            assert (index_arr >= 0).all()
+            return index_arr
 
         return np.array(index_list)
 
@@ -150,12 +143,18 @@ def mkdir_join(path_to_dir, *dir_name):
 # = 74 labels
 ############################################################
 
-DOUBLE_LETTERS = ['aa', 'bb', 'cc', 'dd', 'ee', 'ff', 'gg', 'hh', 'ii', 'jj',
-                  'kk', 'll', 'mm', 'nn', 'oo', 'pp', 'qq', 'rr', 'ss', 'tt',
-                  'uu', 'vv', 'ww', 'xx', 'yy', 'zz']
+DOUBLE_LETTERS = frozenset([
+    'aa', 'bb', 'cc', 'dd', 'ee', 'ff', 'gg', 'hh', 'ii', 'jj',
+    'kk', 'll', 'mm', 'nn', 'oo', 'pp', 'qq', 'rr', 'ss', 'tt',
+    'uu', 'vv', 'ww', 'xx', 'yy', 'zz'])
 SPACE = '_'
 APOSTROPHE = '\''
 
+# Precompiled patterns for transcript cleanup
+_PUNCT_RE = re.compile(r'[\":;!?,.-]+')
+_MULTISPACE_RE = re.compile(r' {2,}')
+_WS_RE = re.compile(r'\s')
+
 
 def read_char(label_paths, vocab_file_save_path, save_vocab_file=False,
               is_test=False):
@@ -175,26 +174,20 @@ def read_char(label_paths, vocab_file_save_path, save_vocab_file=False,
     char_set, char_capital_set = set([]), set([])
     for label_path in tqdm(label_paths):
         with open(label_path, 'r') as f:
-            line = f.readlines()[-1]
-            speaker = label_path.split('/')[-2]
-            utt_index = basename(label_path).split('.')[0]
-            utt_name = speaker + '_' + utt_index
+            # Keep only the last line instead of materializing all lines
+            line = deque(f, maxlen=1)[0]
+            # ex.) label_path: .../speaker/utt_index.txt
+            dir_path, file_name = split(label_path)
+            utt_name = basename(dir_path) + '_' + splitext(file_name)[0]
 
             # Remove 「"」, 「:」, 「;」, 「！」, 「?」, 「,」, 「.」, 「-」
             # Convert to lowercase
-            line = re.sub(r'[\":;!?,.-]+', '', line.strip().lower())
+            line = _PUNCT_RE.sub('', line.strip().lower())
 
             transcript = ' '.join(line.split(' ')[2:])
 
-            # Remove double spaces
-            while '  ' in transcript:
-                transcript = re.sub(r'  ', ' ', transcript)
-
-            # Remove first and last space
-            if transcript[0] == ' ':
-                transcript = transcript[1:]
-            if transcript[-1] == ' ':
-                transcript = transcript[:-1]
+            # Remove consecutive, first and last spaces
+            transcript = _MULTISPACE_RE.sub(' ', transcript).strip()
 
             # Capital-divided
             for word in transcript.split(' '):
@@ -203,7 +196,7 @@ def read_char(label_paths, vocab_file_save_path, save_vocab_file=False,
                 else:
                     # Replace the first character with the capital letter
                     word = word[0].upper() + word[1:]
-                    char_capital_set.add(word[0].upper())
+                    chars = [word[0]]
 
                     # Check double-letters
                     skip_flag = False
@@ -213,20 +206,21 @@ def read_char(label_paths, vocab_file_save_path, save_vocab_file=False,
                             continue
 
                         if not skip_flag and word[i:i + 2] in DOUBLE_LETTERS:
-                            char_capital_set.add(word[i:i + 2])
+                            chars.append(word[i:i + 2])
                             skip_flag = True
                         else:
-                            char_capital_set.add(word[i])
+                            chars.append(word[i])
 
                     # Final character
                     if not skip_flag:
-                        char_capital_set.add(word[-1])
+                        chars.append(word[-1])
+
+                    char_capital_set.update(chars)
 
             # Convert space to "_"
-            transcript = re.sub(r'\s', SPACE, transcript)
+            transcript = _WS_RE.sub(SPACE, transcript)
 
-            for c in list(transcript):
-                char_set.add(c)
+            char_set.update(transcript)
 
             trans_dict[utt_name] = transcript
 
@@ -266,18 +260,21 @@ def read_char(label_paths, vocab_file_save_path, save_vocab_file=False,
     char2idx = Char2idx(char_vocab_file_path)
     char2idx_capital = Char2idx(
         char_capital_vocab_file_path, capital_divide=True)
+
+    @lru_cache(maxsize=None)
+    def _tokenize(transcript):
+        # NOTE: the sx prompts are shared across speakers, so identical
+        # transcripts are tokenized only once
+        char_indices = ' '.join(map(str, char2idx(transcript).tolist()))
+        char_indices_capital = ' '.join(
+            map(str, char2idx_capital(transcript).tolist()))
+        return char_indices, char_indices_capital
+
     for utt_name, transcript in tqdm(trans_dict.items()):
         if is_test:
             trans_dict[utt_name] = [transcript, transcript]
             # NOTE: save as it is
         else:
-            char_indices = char2idx(transcript)
-            char_indices_capital = char2idx_capital(transcript)
-
-            char_indices = ' '.join(list(map(str, char_indices.tolist())))
-            char_indices_capital = ' '.join(
-                list(map(str, char_indices_capital.tolist())))
-
-            trans_dict[utt_name] = [char_indices, char_indices_capital]
+            trans_dict[utt_name] = list(_tokenize(transcript))
 
     return trans_dict
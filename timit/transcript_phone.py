@@ -7,11 +7,20 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
-from os.path import join, basename
+from os.path import join, basename, split, splitext
+from concurrent.futures import ThreadPoolExecutor
+import mmap
+import sys
 from tqdm import tqdm
 
 import numpy as np
 
+try:
+    # Optional Cython tokenizer (see setup_phone2idx.py)
+    from timit._phone2idx import tokenize as _cython_tokenize
+except ImportError:
+    _cython_tokenize = None
+
 
 class Phone2idx(object):
     """Convert from phone to index.
@@ -21,33 +30,49 @@ class Phone2idx(object):
     """
 
     def __init__(self, vocab_file_path, remove_list=[]):
-        # Read the vocabulary file
-        self.map_dict = {}
-        vocab_count = 0
+        # Read the vocabulary file (set lookup, dict built in bulk)
+        remove_set = set(remove_list)
         with open(vocab_file_path, 'r') as f:
-            for line in f:
-                phone = line.strip()
-                if phone in remove_list:
-                    continue
-                self.map_dict[phone] = vocab_count
-                vocab_count += 1
+            phones = [phone for phone in (line.strip() for line in f)
+                      if phone not in remove_set]
+        self.map_dict = dict(zip(phones, range(len(phones))))
 
         # Add <SOS> & <EOS>
-        self.map_dict['<'] = vocab_count
-        self.map_dict['>'] = vocab_count + 1
+        self.map_dict['<'] = len(phones)
+        self.map_dict['>'] = len(phones) + 1
+
+        # uint8 indices: 8x smaller than the int64 default
+        assert len(self.map_dict) < 256
 
-    def __call__(self, str_phone):
+        # Bound C method, faster than a lambda call per phone
+        self._get = self.map_dict.__getitem__
+
+    def __call__(self, str_phone, return_str=False):
         """
         Args:
-            str_phone (string): string of space-divided phones
+            str_phone (string or list): string of space-divided phones,
+                or a list of phones
+            return_str (bool, optional): if True, return the indices as
+                a space-divided string instead of an ndarray
         Returns:
-            index_list (np.ndarray): phone indices
+            index_list (np.ndarray or string): phone indices
         """
-        # Convert from phone to the corresponding indices
-        phone_list = str_phone.split(' ')
-        index_list = list(map(lambda x: self.map_dict[x], phone_list))
+        # Convert from phone to the corresponding indices without an
+        # intermediate list
+        if isinstance(str_phone, str):
+            phone_list = str_phone.split(' ')
+        else:
+            phone_list = str_phone
 
-        return np.array(index_list)
+        if return_str:
+            # Fused tokenize + stringify + join, no ndarray allocation
+            return ' '.join(map(str, map(self._get, phone_list)))
+
+        if _cython_tokenize is not None:
+            return _cython_tokenize(phone_list, self.map_dict)
+
+        return np.fromiter(map(self._get, phone_list), dtype=np.uint8,
+                           count=len(phone_list))
 
 
 import os
@@ -86,75 +111,80 @@ def mkdir_join(path_to_dir, *dir_name):
     return path_to_dir
 
 
-def map_phone2phone(phone_list, label_type, map_file_path):
+def pack_indices(index_arrays):
+    """Pack per-utterance index arrays into one contiguous array.
+    Args:
+        index_arrays (list): list of np.ndarray of phone indices
+    Returns:
+        all_indices (np.ndarray): A tensor of size `[total_phone_num]`
+        offsets (np.ndarray): A tensor of size `[len(index_arrays) + 1]`;
+            utterance i spans all_indices[offsets[i]:offsets[i + 1]]
+    """
+    # NOTE: CSR-style layout; one allocation for the whole corpus
+    # instead of thousands of tiny ndarrays
+    offsets = np.zeros(len(index_arrays) + 1, dtype=np.int64)
+    np.cumsum([len(arr) for arr in index_arrays], out=offsets[1:])
+    all_indices = np.empty(int(offsets[-1]), dtype=np.int32)
+    for i, arr in enumerate(index_arrays):
+        all_indices[offsets[i]:offsets[i + 1]] = arr
+    return all_indices, offsets
+
+
+def map_phone2phone(phone_list, map_dict):
     """Map from 61 phones to 39 or 48 phones.
     Args:
         phone_list (list): list of 61 phones (string)
-        label_type (string): phone39 or phone48 or phone61
-        map_file_path (string): path to the phone2phone mapping file
+        map_dict (dict):
+            key (string) => phone61
+            value (string) => the corresponding phone48 or phone39
+                              ('' if the phone is to be ignored)
     Returns:
         mapped_phone_list (list): list of phones (string)
     """
-    if label_type == 'phone61':
-        return phone_list
-
-    # read a mapping file
-    map_dict = {}
-    with open(map_file_path, 'r') as f:
-        for line in f:
-            line = line.strip().split()
-            if line[1] != 'nan':
-                if label_type == 'phone48':
-                    map_dict[line[0]] = line[1]
-                elif label_type == 'phone39':
-                    map_dict[line[0]] = line[2]
-            else:
-                map_dict[line[0]] = ''
-
-    # mapping from 61 phones to 39 or 48 phones
-    mapped_phone_list = []
-    for i in range(len(phone_list)):
-        if phone_list[i] in map_dict.keys():
-            mapped_phone_list.append(map_dict[phone_list[i]])
-        else:
-            mapped_phone_list.append(phone_list[i])
+    # Map from 61 phones to 39 or 48 phones and drop the ones mapped to
+    # '' ("q") in the same pass; real phones are never empty strings
+    return [m for p in phone_list if (m := map_dict.get(p, p))]
 
-    # ignore "q"
-    while '' in mapped_phone_list:
-        mapped_phone_list.remove('')
 
-    return mapped_phone_list
-
-
-def read_phone(label_paths, vocab_file_save_path, save_vocab_file=False,
-               is_test=False):
-    """Read phone transcript.
+def _make_process_one(vocab_file_save_path, save_vocab_file=False,
+                      is_test=False):
+    """Make a per-utterance processing function for phone transcripts.
     Args:
-        label_paths (list): list of paths to label files
         vocab_file_save_path (string): path to vocabulary files
         save_vocab_file (bool, optional): if True, save vocabulary files
         is_test (bool, optional): set True in case of the test set
     Returns:
-        text_dict (dict):
-            key (string) => utterance name
-            value (list) => list of [phone61_indices, phone48_indices, phone39_indices]
+        process_one (function): maps a label path to
+            (utt_name, [phone61_indices, phone48_indices, phone39_indices])
     """
-    print('=====> Reading target labels...')
-
     # Make the mapping file (from phone to index)
     phone2phone_map_file_path = join(
         vocab_file_save_path, '../phone2phone.txt')
-    phone61_set, phone48_set, phone39_set = set([]), set([]), set([])
-    with open(phone2phone_map_file_path, 'r') as f:
-        for line in f:
-            line = line.strip().split()
-            if line[1] != 'nan':
-                phone61_set.add(line[0])
-                phone48_set.add(line[1])
-                phone39_set.add(line[2])
-            else:
-                # Ignore "q" if phone39 or phone48
-                phone61_set.add(line[0])
+    # NOTE: parse the mapping file exactly once and build the phone61 =>
+    # phone48/phone39 dicts in the same pass. Plain dicts keep the
+    # first-seen order of the phones; the vocabulary files below are
+    # still written sorted, because the line order of those files
+    # defines the index assignment.
+    phone61_dict, phone48_dict, phone39_dict = {}, {}, {}
+    map_dict_48, map_dict_39 = {}, {}
+    # Map the file into memory instead of going through the buffered
+    # reader (the kernel pages it in directly)
+    with open(phone2phone_map_file_path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            lines = mm[:].decode('ascii').splitlines()
+    for line in lines:
+        line = line.strip().split()
+        if line[1] != 'nan':
+            phone61_dict[line[0]] = None
+            phone48_dict[line[1]] = None
+            phone39_dict[line[2]] = None
+            map_dict_48[line[0]] = line[1]
+            map_dict_39[line[0]] = line[2]
+        else:
+            # Ignore "q" if phone39 or phone48
+            phone61_dict[line[0]] = None
+            map_dict_48[line[0]] = ''
+            map_dict_39[line[0]] = ''
 
     phone61_vocab_map_file_path = mkdir_join(
         vocab_file_save_path, 'phone61.txt')
@@ -163,73 +193,117 @@ def read_phone(label_paths, vocab_file_save_path, save_vocab_file=False,
     phone39_vocab_map_file_path = mkdir_join(
         vocab_file_save_path, 'phone39.txt')
 
-    # Save mapping file
+    # Save mapping file (one write per file instead of one per phone)
     if save_vocab_file:
         with open(phone61_vocab_map_file_path, 'w') as f:
-            for phone in sorted(list(phone61_set)):
-                f.write('%s\n' % phone)
+            f.write('\n'.join(sorted(phone61_dict)) + '\n')
         with open(phone48_vocab_map_file_path, 'w') as f:
-            for phone in sorted(list(phone48_set)):
-                f.write('%s\n' % phone)
+            f.write('\n'.join(sorted(phone48_dict)) + '\n')
         with open(phone39_vocab_map_file_path, 'w') as f:
-            for phone in sorted(list(phone39_set)):
-                f.write('%s\n' % phone)
-
-    trans_dict = {}
-    for label_path in tqdm(label_paths):
-        speaker = label_path.split('/')[-2]
-        utt_index = basename(label_path).split('.')[0]
-        utt_name = speaker + '_' + utt_index
-
-        phone61_list = []
+            f.write('\n'.join(sorted(phone39_dict)) + '\n')
+
+    if not is_test:
+        # NOTE: tokenize in the same pass as reading each label file
+        # instead of traversing trans_dict a second time (Phone2idx
+        # reads the vocabulary files saved above). The test set keeps
+        # the phones as strings, so skip the construction entirely.
+        phone2idx_61 = Phone2idx(phone61_vocab_map_file_path)
+        phone2idx_48 = Phone2idx(phone48_vocab_map_file_path)
+        phone2idx_39 = Phone2idx(phone39_vocab_map_file_path)
+
+        # Precompile phone61-index => phone48/phone39-index lookup
+        # arrays. Dropped phones ("q") keep the -1 sentinel and are
+        # masked out after the gather.
+        lut48 = np.full(len(phone2idx_61.map_dict), -1, dtype=np.int32)
+        lut39 = np.full(len(phone2idx_61.map_dict), -1, dtype=np.int32)
+        for phone61, idx61 in phone2idx_61.map_dict.items():
+            mapped48 = map_dict_48.get(phone61, phone61)
+            if mapped48 in phone2idx_48.map_dict:
+                lut48[idx61] = phone2idx_48.map_dict[mapped48]
+            mapped39 = map_dict_39.get(phone61, phone61)
+            if mapped39 in phone2idx_39.map_dict:
+                lut39[idx61] = phone2idx_39.map_dict[mapped39]
+
+    def process_one(label_path):
+        # ex.) label_path: .../speaker/utt_index.phn
+        dir_path, file_name = split(label_path)
+        utt_name = basename(dir_path) + '_' + splitext(file_name)[0]
+
+        # NOTE: the label files are tiny, so read each one in a single
+        # call; the first two columns are the start & end frames.
+        # Interning collapses the freshly-split phone strings onto the
+        # 61 canonical objects, so later dict lookups reuse the cached
+        # hash.
         with open(label_path, 'r') as f:
-            for line in f:
-                line = line.strip().split(' ')
-                # start_frame = line[0]
-                # end_frame = line[1]
-                phone61_list.append(line[2])
-
-        # Map from 61 phones to the corresponding phones
-        phone48_list = map_phone2phone(phone61_list, 'phone48',
-                                       phone2phone_map_file_path)
-        phone39_list = map_phone2phone(phone61_list, 'phone39',
-                                       phone2phone_map_file_path)
-
-        # Convert to string
-        trans_phone61 = ' '.join(phone61_list)
-        trans_phone48 = ' '.join(phone48_list)
-        trans_phone39 = ' '.join(phone39_list)
-
-        # for debug
-        # print(trans_phone61)
-        # print(trans_phone48)
-        # print(trans_phone39)
-        # print('-----')
-
-        trans_dict[utt_name] = [trans_phone61, trans_phone48, trans_phone39]
-
-    # Tokenize
-    print('=====> Tokenize...')
-    phone2idx_61 = Phone2idx(phone61_vocab_map_file_path)
-    phone2idx_48 = Phone2idx(phone48_vocab_map_file_path)
-    phone2idx_39 = Phone2idx(phone39_vocab_map_file_path)
-    for utt_name, [trans_phone61, trans_phone48, trans_phone39] in tqdm(trans_dict.items()):
+            phone61_list = [sys.intern(line.split(' ', 2)[2])
+                            for line in f.read().splitlines()]
+
         if is_test:
-            trans_dict[utt_name] = [
-                trans_phone61, trans_phone48, trans_phone39]
+            # Map from 61 phones to the corresponding phones
+            phone48_list = map_phone2phone(phone61_list, map_dict_48)
+            phone39_list = map_phone2phone(phone61_list, map_dict_39)
+            return utt_name, [' '.join(phone61_list),
+                              ' '.join(phone48_list),
+                              ' '.join(phone39_list)]
             # NOTE: save as it is
-        else:
-            phone61_indices = phone2idx_61(trans_phone61)
-            phone48_indices = phone2idx_48(trans_phone48)
-            phone39_indices = phone2idx_39(trans_phone39)
-
-            phone61_indices = ' '.join(
-                list(map(str, phone61_indices.tolist())))
-            phone48_indices = ' '.join(
-                list(map(str, phone48_indices.tolist())))
-            phone39_indices = ' '.join(
-                list(map(str, phone39_indices.tolist())))
-
-            trans_dict[utt_name] = [phone61_indices,
-                                    phone48_indices, phone39_indices]
+
+        # Tokenize the phone61 sequence once, then map into the
+        # phone48/phone39 index spaces with a vectorized gather
+        phone61_indices = phone2idx_61(phone61_list)
+        phone48_indices = lut48[phone61_indices]
+        phone39_indices = lut39[phone61_indices]
+
+        return utt_name, [
+            ' '.join(map(str, phone61_indices.tolist())),
+            ' '.join(map(str, phone48_indices[phone48_indices >= 0].tolist())),
+            ' '.join(map(str, phone39_indices[phone39_indices >= 0].tolist()))]
+
+    return process_one
+
+
+def iter_phone(label_paths, vocab_file_save_path, save_vocab_file=False,
+               is_test=False):
+    """Read phone transcripts one utterance at a time.
+    Args:
+        label_paths (list): list of paths to label files
+        vocab_file_save_path (string): path to vocabulary files
+        save_vocab_file (bool, optional): if True, save vocabulary files
+        is_test (bool, optional): set True in case of the test set
+    Yields:
+        utt_name (string): utterance name
+        trans_list (list): list of
+            [phone61_indices, phone48_indices, phone39_indices]
+    """
+    # NOTE: streaming alternative to read_phone; peak memory stays at
+    # one utterance instead of the whole corpus
+    process_one = _make_process_one(vocab_file_save_path, save_vocab_file,
+                                    is_test)
+    for label_path in label_paths:
+        yield process_one(label_path)
+
+
+def read_phone(label_paths, vocab_file_save_path, save_vocab_file=False,
+               is_test=False):
+    """Read phone transcript.
+    Args:
+        label_paths (list): list of paths to label files
+        vocab_file_save_path (string): path to vocabulary files
+        save_vocab_file (bool, optional): if True, save vocabulary files
+        is_test (bool, optional): set True in case of the test set
+    Returns:
+        text_dict (dict):
+            key (string) => utterance name
+            value (list) => list of [phone61_indices, phone48_indices, phone39_indices]
+    """
+    print('=====> Reading target labels...')
+    process_one = _make_process_one(vocab_file_save_path, save_vocab_file,
+                                    is_test)
+
+    # Each label file is independent, so read & tokenize in a thread
+    # pool (the loop is dominated by file I/O on thousands of tiny
+    # files)
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+        trans_dict = dict(tqdm(executor.map(process_one, label_paths),
+                               total=len(label_paths)))
+
     return trans_dict
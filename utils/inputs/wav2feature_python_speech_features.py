@@ -12,7 +12,33 @@ from __future__ import print_function
 import subprocess
 import numpy as np
 import scipy.io.wavfile
-from python_speech_features import mfcc, fbank
+from python_speech_features import mfcc, fbank, sigproc, get_filterbanks
+
+
+def _read_wav(wav_path):
+    """Read a wav file, falling back to sox for NIST sphere files.
+    Args:
+        wav_path (string): the path to a wav file
+    Returns:
+        fs (int): sampling rate
+        audio (np.ndarray): raw waveform
+    """
+    try:
+        fs, audio = scipy.io.wavfile.read(wav_path)
+    except ValueError:
+        # Read NIST file
+        wav_path_tmp = './tmp.wav'
+        # result = subprocess.call(['sph2pipe', '-f', 'wav', wav_path, wav_path_tmp])
+        result = subprocess.call(['sox', wav_path, '-t', 'wav', wav_path_tmp])
+
+        if result != 0:
+            raise ValueError
+
+        # Try again
+        fs, audio = scipy.io.wavfile.read(wav_path_tmp)
+        subprocess.call(['rm', wav_path_tmp])
+
+    return fs, audio
 
 
 def wav2feature(wav_path, feature_type='logfbank', feature_dim=40,
@@ -40,20 +66,7 @@ def wav2feature(wav_path, feature_type='logfbank', feature_dim=40,
         delta1 = True
 
     # Read wav file
-    try:
-        fs, audio = scipy.io.wavfile.read(wav_path)
-    except ValueError:
-        # Read NIST file
-        wav_path_tmp = './tmp.wav'
-        # result = subprocess.call(['sph2pipe', '-f', 'wav', wav_path, wav_path_tmp])
-        result = subprocess.call(['sox', wav_path, '-t', 'wav', wav_path_tmp])
-
-        if result != 0:
-            raise ValueError
-
-        # Try again
-        fs, audio = scipy.io.wavfile.read(wav_path_tmp)
-        subprocess.call(['rm', wav_path_tmp])
+    fs, audio = _read_wav(wav_path)
 
     if feature_type == 'mfcc':
         feat = mfcc(audio,
@@ -97,6 +110,89 @@ def wav2feature(wav_path, feature_type='logfbank', feature_dim=40,
     return feat
 
 
+def wav2feature_batch(wav_paths, feature_type='logfbank', feature_dim=40,
+                      use_energy=True, use_delta1=True, use_delta2=True,
+                      window=0.025, slide=0.01, dtype=np.float64):
+    """Convert a batch of wav files to filterbank features at once.
+    The mel filterbank matrix depends only on the sampling rate, so it is
+    built once per rate and reused across all files instead of being
+    recomputed inside fbank() per file.
+    Args:
+        wav_paths (list): paths to wav files
+        feature_type (string, optional): logfbank or fbank or mfcc
+        feature_dim (int, optional): the demension of each feature
+        use_energy (bool, optional): if True, add energy
+        use_delta1 (bool, optional): if True, add delta features
+        use_delta2 (bool, optional): if True, add delta delta features
+        window (float, optional): window width to extract features
+        slide (float, optional): extract features per 'slide'
+        dtype (optional): default is np.float64
+    Returns:
+        feat_list (list): list of np.ndarray of size `[T, feature_dim]`
+    """
+    if feature_type == 'logmelfbank':
+        feature_type = 'logfbank'
+    if feature_type not in ['logfbank', 'fbank', 'mfcc']:
+        raise ValueError('feature_type is or "logfbank" or "fbank" or "mfcc".')
+    if feature_type == 'mfcc':
+        # The cepstral path has no shared state worth caching
+        return [wav2feature(wav_path,
+                            feature_type=feature_type,
+                            feature_dim=feature_dim,
+                            use_energy=use_energy,
+                            use_delta1=use_delta1,
+                            use_delta2=use_delta2,
+                            window=window,
+                            slide=slide,
+                            dtype=dtype)
+                for wav_path in wav_paths]
+
+    nfft = 512
+    preemph = 0.97
+    eps = np.finfo(np.float64).eps
+    filterbank_dict = {}
+
+    feat_list = []
+    for wav_path in wav_paths:
+        fs, audio = _read_wav(wav_path)
+
+        # Build the mel filterbank matrix once per sampling rate
+        if fs not in filterbank_dict:
+            filterbank_dict[fs] = get_filterbanks(
+                nfilt=feature_dim, nfft=nfft, samplerate=fs,
+                lowfreq=0, highfreq=None).T
+
+        # Same pipeline as python_speech_features.fbank, with the
+        # filterbank matrix hoisted out
+        signal = sigproc.preemphasis(audio, preemph)
+        frames = sigproc.framesig(
+            signal, window * fs, slide * fs, winfunc=np.hamming)
+        pspec = sigproc.powspec(frames, nfft)
+        energy_feat = np.sum(pspec, 1)
+        energy_feat = np.where(energy_feat == 0, eps, energy_feat)
+
+        feat = np.dot(pspec, filterbank_dict[fs])
+        feat = np.where(feat == 0, eps, feat)
+
+        if feature_type == 'logfbank':
+            feat = np.log(feat)
+        if use_energy:
+            feat = np.concatenate(
+                (feat, energy_feat.reshape(-1, 1)), axis=1)
+
+        if use_delta2:
+            delta1_feat = _delta(feat, N=2)
+            delta2_feat = _delta(delta1_feat, N=2)
+            feat = np.concatenate((feat, delta1_feat, delta2_feat), axis=1)
+        elif use_delta1:
+            delta1_feat = _delta(feat, N=2)
+            feat = np.concatenate((feat, delta1_feat), axis=1)
+
+        feat_list.append(feat)
+
+    return feat_list
+
+
 def _delta(feat, N):
     """Compute delta features from a feature vector sequence.
     Args:
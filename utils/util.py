@@ -5,9 +5,11 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+import functools
 import os
 
 
+@functools.lru_cache(maxsize=None)
 def mkdir(path_to_dir):
     """Make a new directory if the directory does not exist.
     Args:
@@ -15,6 +17,8 @@ def mkdir(path_to_dir):
     Returns:
         path (string): path to the new directory
     """
+    # NOTE: mkdir_join re-checks the same prefixes for every utterance;
+    # caching is safe because the directory stays created afterwards
     if path_to_dir is not None and (not os.path.isdir(path_to_dir)):
         os.mkdir(path_to_dir)
     return path_to_dir